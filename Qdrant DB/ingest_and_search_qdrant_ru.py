@@ -8,15 +8,25 @@ ingest_and_search_qdrant_ru.py
 - Эмбеддинги для d0rj/e5-base-en-ru через sentence-transformers (mean pooling + L2).
 - Кэш энкодера (модель грузится один раз).
 - Автосборка QDRANT_URL из QDRANT_HOST/QDRANT_PORT/QDRANT_HTTPS, если QDRANT_URL не задан.
+- Транспорт gRPC (QDRANT_GRPC_PORT, по умолчанию 6334) с keep-alive; REST — через QDRANT_PREFER_GRPC=0.
+- Таймаут запросов к Qdrant: QDRANT_TIMEOUT (секунды, по умолчанию 5).
+- Ширина обхода HNSW при поиске: QDRANT_EF_SEARCH (по умолчанию 64, не меньше --topk).
 - Безопасное пересоздание коллекции (delete -> create), batch-upsert.
-- Нормализованные эмбеддинги (COSINE).
+- Нормализованные эмбеддинги и метрика DOT (для единичных векторов совпадает с COSINE).
+- Квантизация векторов в RAM (QDRANT_QUANTIZATION=int8|binary, по умолчанию int8)
+  и HNSW-граф на диске; поиск идёт по квантованным векторам с oversampling
+  и rescore по исходным. Если у существующей коллекции квантизация другая,
+  она меняется через update_collection без переиндексации.
 - Гибридный поиск: семантика (Qdrant) + BM25-переранжировка по тексту документа (payload["text_bm25"]),
   с фильтрами must по category/source в Qdrant и финальным смешиванием скорингов.
+- Вопрос и ответ FAQ лежат на верхнем уровне payload, поиск не запрашивает полный "raw";
+  точки, залитые до этого, переносятся разовой миграцией --migrate-payload.
 - Удобный вывод: человекочитаемый и JSON (--json).
 
 CLI:
     --ingest                 заливка данных из ./processed
     --recreate               пересоздать коллекцию перед заливкой
+    --migrate-payload        вынести question/answer FAQ из raw на верхний уровень payload
     --query "текст"          быстрый поиск
     --cat rooms|faq|...      фильтр категории (must)
     --source "Частые вопросы" фильтр источника (must)
@@ -33,6 +43,7 @@ import os
 import sys
 import json
 import argparse
+import heapq
 import uuid
 import math
 import re
@@ -46,7 +57,10 @@ from dotenv import load_dotenv
 from qdrant_client import QdrantClient
 from qdrant_client.http.models import (
     Distance, VectorParams, PointStruct,
-    Filter, FieldCondition, MatchValue
+    Filter, FieldCondition, MatchValue,
+    BinaryQuantization, BinaryQuantizationConfig, HnswConfigDiff,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    SearchParams, QuantizationSearchParams,
 )
 from qdrant_client.http.exceptions import UnexpectedResponse
 
@@ -124,6 +138,19 @@ else:
 QDRANT_URL = os.getenv("QDRANT_URL", default_url)
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")        # может быть пустым на локали
 COLLECTION = os.getenv("QDRANT_COLLECTION") or os.getenv("COLLECTION_NAME", "hotel_knowledge")
+QDRANT_PREFER_GRPC = _as_bool_env(os.getenv("QDRANT_PREFER_GRPC"), True)
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "5"))  # секунды на запрос
+QDRANT_EF_SEARCH = int(os.getenv("QDRANT_EF_SEARCH", "64"))  # hnsw_ef: точность против задержки
+
+# Поля payload, которые читают гибридный поиск и вывод результатов; полный "raw"
+# с сервера не тянем — вопрос и ответ FAQ кладутся на верхний уровень при заливке
+SEARCH_PAYLOAD_FIELDS = ["category", "title", "source", "text_bm25", "question", "answer"]
+# int8 — в 4 раза меньше float32 почти без потери полноты; binary — 1 бит на измерение,
+# заметно теряет полноту на 768-мерных e5-векторах даже с rescore
+QDRANT_QUANTIZATION = (os.getenv("QDRANT_QUANTIZATION") or "int8").strip().lower()
+# Во сколько раз больше кандидатов отбирать по квантованным векторам перед rescore
+QUANTIZATION_OVERSAMPLING = 2.0
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Encoder: SentenceTransformer с единым загрузчиком и форматированием текста
@@ -161,7 +188,20 @@ def get_encoder():
 # Работа с Qdrant
 # ─────────────────────────────────────────────────────────────────────────────
 def qdrant_client() -> QdrantClient:
-    client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+    # gRPC передаёт вектор protobuf'ом вместо JSON и держит один HTTP/2-канал;
+    # явный таймаут не даёт зависшему поиску держать процесс бесконечно
+    client = QdrantClient(
+        url=QDRANT_URL,
+        api_key=QDRANT_API_KEY,
+        timeout=QDRANT_TIMEOUT,
+        prefer_grpc=QDRANT_PREFER_GRPC,
+        grpc_port=QDRANT_GRPC_PORT,
+        grpc_options={
+            "grpc.keepalive_time_ms": 30000,
+            "grpc.keepalive_timeout_ms": 10000,
+            "grpc.http2.min_time_between_pings_ms": 20000,
+        },
+    )
     return client
 
 def check_qdrant_alive(client: QdrantClient):
@@ -172,24 +212,49 @@ def check_qdrant_alive(client: QdrantClient):
         print(f"[Qdrant] Недоступно: {e}\nПроверь QDRANT_URL={QDRANT_URL}, API-ключ, сеть/файрвол и что сервис запущен.")
         raise
 
-def recreate_collection_safe(client: QdrantClient, name: str, vector_size: int, distance=Distance.COSINE):
+def _quantization_config():
+    """Конфиг квантизации по QDRANT_QUANTIZATION; квантованные векторы держим в RAM."""
+    if QDRANT_QUANTIZATION == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    if QDRANT_QUANTIZATION != "int8":
+        print(f"[Qdrant] Неизвестный QDRANT_QUANTIZATION={QDRANT_QUANTIZATION!r}, используем int8")
+    return ScalarQuantization(
+        scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+    )
+
+def _create_collection(client: QdrantClient, name: str, vector_size: int, distance=Distance.DOT):
+    """Создаём коллекцию: квантованные векторы держатся в RAM, HNSW-граф — на диске."""
+    client.create_collection(
+        collection_name=name,
+        vectors_config=VectorParams(size=vector_size, distance=distance),
+        quantization_config=_quantization_config(),
+        hnsw_config=HnswConfigDiff(on_disk=True),
+    )
+
+def recreate_collection_safe(client: QdrantClient, name: str, vector_size: int, distance=Distance.DOT):
     """Удаляем коллекцию, если есть, затем создаём заново."""
     try:
         client.delete_collection(name)
         print(f"[Qdrant] Удалена коллекция: {name}")
     except UnexpectedResponse:
         print(f"[Qdrant] Коллекции {name} не было — ок")
-    client.create_collection(collection_name=name, vectors_config=VectorParams(size=vector_size, distance=distance))
+    _create_collection(client, name, vector_size, distance)
     print(f"[Qdrant] Создана коллекция: {name} (size={vector_size}, distance={distance})")
 
 def ensure_collection(client: QdrantClient, name: str, vector_size: int):
     """Создаём коллекцию, если её нет."""
     cols = client.get_collections().collections
     if not any(c.name == name for c in cols):
-        client.create_collection(collection_name=name, vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE))
+        _create_collection(client, name, vector_size)
         print(f"[Qdrant] Создана коллекция: {name}")
     else:
         print(f"[Qdrant] Коллекция уже существует: {name}")
+        wanted = _quantization_config()
+        current = client.get_collection(name).config.quantization_config
+        if current != wanted:
+            # Квантизацию можно сменить на лету: Qdrant пересчитает её в фоне
+            client.update_collection(collection_name=name, quantization_config=wanted)
+            print(f"[Qdrant] Квантизация коллекции {name} изменена на {QDRANT_QUANTIZATION}")
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Загрузка данных из ./processed
@@ -338,6 +403,8 @@ def ingest(recreate: bool = False):
             "text_bm25": text,   # важно для гибридного поиска
             "raw": item,         # полный объект
         }
+        if item.get("category") == "faq":
+            payload.update(_faq_flat_fields(item))
         pid = str(uuid.uuid4())
         batch_ids.append(pid)
         batch_texts.append(text)
@@ -350,6 +417,41 @@ def ingest(recreate: bool = False):
     flush_batch()
     print(f"[DONE] Ингест завершён. Всего документов: {total}")
 
+def _faq_flat_fields(item: Dict[str, Any]) -> Dict[str, str]:
+    """Поля FAQ, которые поиск читает с верхнего уровня payload вместо "raw"."""
+    return {"question": item.get("question") or "", "answer": item.get("answer") or ""}
+
+def migrate_faq_payload():
+    """Разовая миграция: дописать question/answer точкам FAQ, залитым без них."""
+    client = qdrant_client()
+    check_qdrant_alive(client)
+
+    faq_filter = Filter(must=[FieldCondition(key="category", match=MatchValue(value="faq"))])
+    updated = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=COLLECTION,
+            scroll_filter=faq_filter,
+            limit=256,
+            offset=offset,
+            with_payload=["raw", "question"],
+            with_vectors=False,
+        )
+        for point in points:
+            payload = point.payload or {}
+            if "question" in payload:
+                continue
+            client.set_payload(
+                collection_name=COLLECTION,
+                payload=_faq_flat_fields(payload.get("raw") or {}),
+                points=[point.id],
+            )
+            updated += 1
+        if offset is None:
+            break
+    print(f"[MIGRATE] Обновлено FAQ-точек: {updated}")
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Токенизация и BM25
 # ─────────────────────────────────────────────────────────────────────────────
@@ -449,6 +551,16 @@ def search(query: str,
         must_conditions.append(FieldCondition(key="source", match=MatchValue(value=where_source)))
 
     q_filter = Filter(must=must_conditions) if must_conditions else None
+    search_params = SearchParams(
+        # ef меньше числа кандидатов урезал бы выдачу, поэтому берём не меньше topk
+        hnsw_ef=max(QDRANT_EF_SEARCH, topk),
+        exact=False,
+        quantization=QuantizationSearchParams(
+            ignore=False,
+            rescore=True,
+            oversampling=QUANTIZATION_OVERSAMPLING,
+        )
+    )
 
     # Универсальный вызов: в разных версиях клиента параметр называется query_filter / filter
     try:
@@ -456,8 +568,9 @@ def search(query: str,
             collection_name=COLLECTION,
             query=qv,
             limit=topk,
-            with_payload=True,
+            with_payload=SEARCH_PAYLOAD_FIELDS,
             query_filter=q_filter,   # новое имя аргумента
+            search_params=search_params,
             with_vectors=False,
         )
     except TypeError:
@@ -465,8 +578,9 @@ def search(query: str,
             collection_name=COLLECTION,
             query=qv,
             limit=topk,
-            with_payload=True,
+            with_payload=SEARCH_PAYLOAD_FIELDS,
             filter=q_filter,         # альтернативное имя аргумента
+            search_params=search_params,
             with_vectors=False,
         )
 
@@ -517,12 +631,11 @@ def search(query: str,
     alpha = max(0.0, min(1.0, alpha))
     blended = [alpha * s + (1 - alpha) * b for s, b in zip(sem_norm, bm25_norm)]
 
-    # Сортируем по blended убыванию
-    idx = list(range(len(raw)))
-    idx.sort(key=lambda i: blended[i], reverse=True)
+    # Нужны только лучшие limit из topk кандидатов: частичная выборка вместо полной сортировки
+    idx = heapq.nlargest(max(1, limit), range(len(raw)), key=blended.__getitem__)
 
     final = []
-    for i in idx[:max(1, limit)]:
+    for i in idx:
         pl, sem = raw[i]
         final.append({
             "score_sem": sem_scores[i],
@@ -533,6 +646,10 @@ def search(query: str,
             "payload": pl
         })
 
+    if any(r["payload"].get("category") == "faq" and "question" not in r["payload"] for r in final):
+        print("[SEARCH] У части FAQ-точек нет полей question/answer — запустите --migrate-payload",
+              file=sys.stderr)
+
     # Вывод
     if as_json or os.getenv("SEARCH_JSON") == "1":
         print(json.dumps(final, ensure_ascii=False, indent=2))
@@ -548,9 +665,8 @@ def search(query: str,
         s = r["score_sem_norm"]
         k = r["score_bm25_norm"]
         if cat == "faq":
-            raw_pl = pl.get("raw") or {}
-            q_txt = raw_pl.get("question", "") or "-"
-            a_txt = raw_pl.get("answer", "") or "-"
+            q_txt = pl.get("question") or "-"
+            a_txt = pl.get("answer") or "-"
             print(f"{i:2d}. blend={b:.4f} (sem={s:.3f}, bm25={k:.3f}) | {cat} | {title} | source={src}\n"
                   f"    Q: {q_txt}\n"
                   f"    A: {a_txt}\n")
@@ -564,6 +680,8 @@ def main():
     parser = argparse.ArgumentParser(description="Ingest/Search Qdrant (RU hotel KB, hybrid)")
     parser.add_argument("--ingest", action="store_true", help="Залить данные из ./processed в Qdrant")
     parser.add_argument("--recreate", action="store_true", help="Пересоздать коллекцию перед заливкой")
+    parser.add_argument("--migrate-payload", action="store_true",
+                        help="Вынести question/answer FAQ из raw на верхний уровень payload")
     parser.add_argument("--query", type=str, default=None, help="Поиск: текст запроса")
     parser.add_argument("--cat", type=str, default=None, help="Фильтр категории (rooms/faq/…)")
     parser.add_argument("--source", type=str, default=None, help="Фильтр источника (payload.source)")
@@ -576,6 +694,9 @@ def main():
     if args.ingest:
         ingest(recreate=args.recreate)
 
+    if args.migrate_payload:
+        migrate_faq_payload()
+
     if args.query:
         search(
             query=args.query,
@@ -1,17 +1,30 @@
 """Интеграция с Amvera GPT API."""
 from __future__ import annotations
 
-import json
 import logging
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Sequence
 
+import orjson
 import requests
 
 from .config import Settings
+from .http_client import create_session
 
 
 LOGGER = logging.getLogger("chatbot.amvera")
+MISSING_TOKEN_MESSAGE = "Не задан токен доступа AMVERA_GPT_TOKEN"
+_SESSION = create_session()
+_SYSTEM_MESSAGE = {
+    "role": "system",
+    "text": (
+        "Ты — ассистент загородного отеля усадьбы 'Четыре Сезона'. "
+        "Отвечай гостям кратко, дружелюбно и только на основе предоставленной информации. "
+        "Если информации нет в контексте, вежливо скажи об этом."
+    ),
+}
+# Системное сообщение сериализуется один раз и вклеивается в тело каждого запроса
+_SYSTEM_MESSAGE_JSON = orjson.dumps(_SYSTEM_MESSAGE)
 
 
 @dataclass(slots=True)
@@ -36,7 +49,7 @@ def normalize_token(raw_token: str | None) -> str:
 def ensure_token(settings: Settings) -> str:
     token = normalize_token(settings.amvera_token)
     if not token:
-        raise AmveraError("Не задан токен доступа AMVERA_GPT_TOKEN")
+        raise AmveraError(MISSING_TOKEN_MESSAGE)
     return token
 
 
@@ -49,31 +62,55 @@ def build_headers(settings: Settings, token: str) -> dict[str, str]:
     }
 
 
-def build_payload(model: str | None, context: str, question: str) -> dict[str, Any]:
-    return {
-        "model": model,
-        "messages": [
-            {
-                "role": "system",
-                "text": (
-                    "Ты — ассистент загородного отеля усадьбы 'Четыре Сезона'. "
-                    "Отвечай гостям кратко, дружелюбно и только на основе предоставленной информации. "
-                    "Если информации нет в контексте, вежливо скажи об этом."
-                ),
-            },
-            {
-                "role": "user",
-                "text": f"Контекст:\n{context}\n\nВопрос гостя: {question}",
-            },
-        ],
+def prepare_headers(settings: Settings) -> dict[str, str]:
+    """Собрать заголовки авторизации; токен не меняется за время жизни процесса."""
+
+    return build_headers(settings, ensure_token(settings))
+
+
+def build_payload(
+    model: str | None, context_parts: Sequence[str], question: str
+) -> bytes:
+    """Собрать готовое JSON-тело запроса к модели."""
+
+    context = "\n\n".join(context_parts)
+    user_message = {
+        "role": "user",
+        "text": f"Контекст:\n{context}\n\nВопрос гостя: {question}",
     }
+    return b"".join(
+        (
+            b'{"model":',
+            orjson.dumps(model),
+            b',"messages":[',
+            _SYSTEM_MESSAGE_JSON,
+            b",",
+            orjson.dumps(user_message),
+            b"]}",
+        )
+    )
 
 
 def perform_request(
-    settings: Settings, token: str, payload: dict[str, Any], *, timeout: float
+    settings: Settings,
+    headers: dict[str, str],
+    payload: dict[str, Any] | bytes,
+    *,
+    timeout: float,
 ) -> requests.Response:
-    headers = build_headers(settings, token)
-    return requests.post(settings.amvera_url, headers=headers, json=payload, timeout=timeout)
+    # orjson сразу отдаёт bytes; Content-Type уже задан в prepare_headers
+    body = payload if isinstance(payload, bytes) else orjson.dumps(payload)
+    return _SESSION.post(settings.amvera_url, headers=headers, data=body, timeout=timeout)
+
+
+def decode_response(response: requests.Response) -> Any:
+    """Разобрать JSON-тело ответа через orjson.
+
+    ``orjson.JSONDecodeError`` наследуется от ``ValueError``, поэтому
+    вызывающий код обрабатывает ошибки так же, как с ``response.json()``.
+    """
+
+    return orjson.loads(response.content)
 
 
 def log_error(response: requests.Response) -> None:
@@ -83,10 +120,16 @@ def log_error(response: requests.Response) -> None:
         response.reason,
     )
     try:
-        error_json = response.json()
+        error_json = decode_response(response)
     except ValueError:
         error_json = {"raw": response.text}
-    LOGGER.warning("Тело ошибки: %s", json.dumps(error_json, ensure_ascii=False, indent=2))
+    LOGGER.warning(
+        "Тело ошибки: %s",
+        orjson.dumps(
+            error_json,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+        ).decode(),
+    )
     if response.status_code == 403:
         LOGGER.warning(
             "Код 403 часто означает отсутствие доступа к выбранной модели. "
@@ -113,12 +156,15 @@ def extract_answer(data: dict[str, Any]) -> str:
 
 
 __all__ = [
+    "MISSING_TOKEN_MESSAGE",
     "AmveraError",
     "normalize_token",
     "ensure_token",
     "build_headers",
+    "prepare_headers",
     "build_payload",
     "perform_request",
+    "decode_response",
     "log_error",
     "extract_answer",
 ]
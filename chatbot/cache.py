@@ -0,0 +1,54 @@
+"""Потокобезопасный in-process кэш с ограничением размера и временем жизни."""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Generic, Hashable, TypeVar
+
+
+_V = TypeVar("_V")
+
+
+class TTLCache(Generic[_V]):
+    """LRU-кэш с TTL записей, рассчитанный на gthread-воркеры gunicorn.
+
+    Нулевой ``maxsize`` отключает кэш: ``get`` всегда промахивается, а ``set``
+    ничего не сохраняет.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._maxsize = max(0, maxsize)
+        self._ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, _V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> _V | None:
+        if not self._maxsize:
+            return None
+
+        now = monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: _V) -> None:
+        if not self._maxsize:
+            return
+
+        expires_at = monotonic() + self._ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+
+__all__ = ["TTLCache"]
@@ -19,6 +19,21 @@ def _read_env(name: str, *, required: bool = True, default: str | None = None) -
     return value or ""
 
 
+def _read_int_env(name: str, default: int) -> int:
+    raw_value = os.getenv(name)
+    if raw_value is None or raw_value.strip() == "":
+        return default
+    try:
+        value = int(raw_value)
+    except ValueError as exc:
+        raise SettingsError(
+            f"Переменная окружения {name} должна быть целым числом, получено: {raw_value!r}."
+        ) from exc
+    if value < 0:
+        raise SettingsError(f"Переменная окружения {name} не может быть отрицательной.")
+    return value
+
+
 @dataclass(slots=True, frozen=True)
 class Settings:
     """Иммутабельная модель настроек."""
@@ -34,6 +49,12 @@ class Settings:
 
     local_knowledge_base_path: str
 
+    answer_cache_size: int = 1024
+    answer_cache_ttl: int = 600
+    search_cache_size: int = 1024
+    search_cache_ttl: int = 3600
+    context_max_chars: int = 3000
+
     @classmethod
     def from_env(cls) -> "Settings":
         embedding_model = _read_env("EMBEDDING_MODEL_NAME")
@@ -50,6 +71,11 @@ class Settings:
             amvera_auth_header=os.getenv("AMVERA_AUTH_HEADER", "X-Auth-Token"),
             amvera_auth_prefix=os.getenv("AMVERA_AUTH_PREFIX", "Bearer"),
             local_knowledge_base_path=os.getenv("LOCAL_KNOWLEDGE_BASE_PATH", "knowledge_base"),
+            answer_cache_size=_read_int_env("ANSWER_CACHE_SIZE", 1024),
+            answer_cache_ttl=_read_int_env("ANSWER_CACHE_TTL", 600),
+            search_cache_size=_read_int_env("SEARCH_CACHE_SIZE", 1024),
+            search_cache_ttl=_read_int_env("SEARCH_CACHE_TTL", 3600),
+            context_max_chars=_read_int_env("CONTEXT_MAX_CHARS", 3000),
         )
 
 
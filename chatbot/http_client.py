@@ -0,0 +1,61 @@
+"""Общие HTTP-сессии с пулом keep-alive соединений."""
+from __future__ import annotations
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+_POOL_CONNECTIONS = 4
+_SESSIONS: list[requests.Session] = []
+
+
+def create_session(*, pool_maxsize: int = 16, retries: int = 2) -> requests.Session:
+    """Создать сессию, переиспользующую TCP/TLS-соединения между запросами.
+
+    Повторы выполняются только при ошибках соединения и ответах 502/503/504
+    от шлюза; таймауты чтения не повторяются, чтобы не умножать ожидание.
+    """
+
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        backoff_factor=0.2,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "POST"}),
+        raise_on_status=False,
+    )
+
+    session = requests.Session()
+    _mount_adapter(session, pool_maxsize, retry)
+    _SESSIONS.append(session)
+    return session
+
+
+def resize_session_pools(pool_maxsize: int) -> None:
+    """Пересоздать пулы всех созданных сессий под число потоков воркера.
+
+    Вызывается из хука gunicorn ``post_fork`` со значением ``threads`` из
+    gunicorn.config.py: каждый поток держит не больше одного запроса к
+    внешнему API, поэтому меньший пул заставляет потоки ждать соединение,
+    а больший не используется.
+    """
+
+    for session in _SESSIONS:
+        previous = session.get_adapter("https://")
+        _mount_adapter(session, pool_maxsize, previous.max_retries)
+        previous.close()
+
+
+def _mount_adapter(session: requests.Session, pool_maxsize: int, retry: Retry) -> None:
+    adapter = HTTPAdapter(
+        pool_connections=_POOL_CONNECTIONS,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+__all__ = ["create_session", "resize_session_pools"]
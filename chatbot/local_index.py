@@ -9,6 +9,8 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Iterable, Sequence
 
+import numpy as np
+
 from .rag import SearchResult, normalize_text
 
 
@@ -45,12 +47,31 @@ class LocalIndex:
         }
         self._dimension = len(vocabulary_tokens)
 
-        self._doc_vectors: list[dict[int, float]] = []
-        self._doc_norms: list[float] = []
-        for doc in self._documents:
+        # Веса документов заранее нормированы и хранятся по столбцам (CSC): для
+        # каждого токена — номера документов и веса. Память растёт с числом
+        # ненулевых весов, а не с произведением документов на словарь, а
+        # скоринг затрагивает только столбцы токенов запроса.
+        columns: list[list[tuple[int, float]]] = [[] for _ in range(self._dimension)]
+        for row, doc in enumerate(self._documents):
             vector, norm = self._encode_tokens(doc.normalized_tokens)
-            self._doc_vectors.append(vector)
-            self._doc_norms.append(norm)
+            if norm == 0.0:
+                continue
+            for index, weight in vector.items():
+                columns[index].append((row, weight / norm))
+
+        self._column_offsets = np.zeros(self._dimension + 1, dtype=np.intp)
+        np.cumsum([len(column) for column in columns], out=self._column_offsets[1:])
+        nonzero = int(self._column_offsets[-1])
+        self._column_rows = np.fromiter(
+            (row for column in columns for row, _ in column),
+            dtype=np.intp,
+            count=nonzero,
+        )
+        self._column_weights = np.fromiter(
+            (weight for column in columns for _, weight in column),
+            dtype=np.float32,
+            count=nonzero,
+        )
 
         LOGGER.info(
             "Локальный индекс построен: %s документов, размер словаря %s",
@@ -119,45 +140,48 @@ class LocalIndex:
     def collections(self) -> tuple[str, ...]:
         return self._collections
 
-    def encode(self, text: str) -> list[float]:
-        sparse_vector, _ = self._encode_text(text)
-        dense = [0.0] * self._dimension
-        for index, weight in sparse_vector.items():
-            dense[index] = weight
-        return dense
+    def encode(self, text: str) -> np.ndarray:
+        sparse_vector, norm = self._encode_text(text)
+        return self._dense_vector(sparse_vector, norm)
 
     def get_sentence_embedding_dimension(self) -> int:
         return self._dimension
 
-    def search(
-        self, text: str, *, limit: int = 5
-    ) -> tuple[list[SearchResult], list[float]]:
+    def search(self, text: str, *, limit: int = 5) -> list[SearchResult]:
         sparse_query, query_norm = self._encode_text(text)
         if not sparse_query or query_norm == 0.0:
-            return [], [0.0] * self._dimension
-
-        scored: list[tuple[float, _IndexedDocument]] = []
-        for document, vector, norm in zip(
-            self._documents, self._doc_vectors, self._doc_norms
-        ):
-            if norm == 0.0:
-                continue
-            score = _cosine_similarity(sparse_query, vector, query_norm, norm)
-            if score <= 0.0:
-                continue
-            scored.append((score, document))
+            return []
 
-        scored.sort(key=lambda item: item[0], reverse=True)
-        limited = scored[:limit]
+        scores = np.zeros(self._doc_count, dtype=np.float32)
+        offsets = self._column_offsets
+        for index, weight in sparse_query.items():
+            start, end = offsets[index], offsets[index + 1]
+            # В столбце каждый документ встречается один раз, поэтому сложение
+            # по индексам не теряет обновлений
+            scores[self._column_rows[start:end]] += self._column_weights[start:end] * (
+                weight / query_norm
+            )
 
+        ranked = _top_k(scores, limit)
         results = [
-            SearchResult(collection=doc.collection, score=score, text=doc.text)
-            for score, doc in limited
+            SearchResult(
+                collection=self._documents[position].collection,
+                score=float(scores[position]),
+                text=self._documents[position].text,
+            )
+            for position in ranked
+            if scores[position] > 0.0
         ]
-        dense_query = [0.0] * self._dimension
-        for index, weight in sparse_query.items():
-            dense_query[index] = weight
-        return results, dense_query
+        return results
+
+    def _dense_vector(self, sparse_vector: dict[int, float], norm: float) -> np.ndarray:
+        # Единичный float32-вектор: тот же, что участвует в скоринге документов
+        dense = np.zeros(self._dimension, dtype=np.float32)
+        if norm == 0.0:
+            return dense
+        for index, weight in sparse_vector.items():
+            dense[index] = weight / norm
+        return dense
 
     def _encode_text(self, text: str) -> tuple[dict[int, float], float]:
         tokens = text.split()
@@ -188,6 +212,22 @@ class LocalIndex:
         return vector, math.sqrt(norm_sq)
 
 
+def _top_k(scores: np.ndarray, limit: int) -> np.ndarray:
+    """Индексы ``limit`` лучших оценок по убыванию, при равенстве — по позиции."""
+
+    if limit <= 0:
+        return np.empty(0, dtype=np.intp)
+    if limit < scores.size:
+        # Частичный отбор O(n) вместо полной сортировки всех документов. Берём
+        # все позиции не хуже k-й оценки, чтобы при равенстве на границе
+        # остались первые по позиции документы, а не произвольные.
+        kth = np.partition(scores, scores.size - limit)[scores.size - limit]
+        candidates = np.flatnonzero(scores >= kth)
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind="stable")][:limit]
+
+
 def _collect_text_parts(item: dict) -> list[str]:
     parts: list[str] = []
     for key in ("title", "text", "question", "answer"):
@@ -204,29 +244,4 @@ def _collect_text_parts(item: dict) -> list[str]:
     return parts
 
 
-def _cosine_similarity(
-    lhs: dict[int, float],
-    rhs: dict[int, float],
-    lhs_norm: float,
-    rhs_norm: float,
-) -> float:
-    if lhs_norm == 0.0 or rhs_norm == 0.0:
-        return 0.0
-    dot = 0.0
-    if len(lhs) < len(rhs):
-        iterator = lhs.items()
-        lookup = rhs
-    else:
-        iterator = rhs.items()
-        lookup = lhs
-    for index, weight in iterator:
-        other = lookup.get(index)
-        if other is None:
-            continue
-        dot += weight * other
-    if dot <= 0.0:
-        return 0.0
-    return dot / (lhs_norm * rhs_norm)
-
-
 __all__ = ["LocalIndex"]
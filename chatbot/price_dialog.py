@@ -14,6 +14,9 @@ import pymorphy3
 import requests
 from dateutil.relativedelta import SA, relativedelta
 
+from .http_client import create_session
+from .rag import lemmatize
+
 
 LOGGER = logging.getLogger("chatbot.price_dialog")
 
@@ -39,7 +42,14 @@ SHELTER_TOKEN_ENV = "SHELTER_TOKEN"
 SHELTER_TIMEOUT = 15
 DATE_FORMAT = "%Y-%m-%d"
 
+_WORD_PATTERN = re.compile(r"[а-яёa-z]+")
+_PRICE_PHRASE_PATTERN = re.compile(
+    "|".join(re.escape(phrase) for phrase in PRICE_KEYWORD_PHRASES),
+    re.IGNORECASE,
+)
+
 _SESSIONS: dict[str, "BookingSession"] = {}
+_SHELTER_HTTP = create_session()
 
 
 def _cleanup_expired_sessions(now: datetime) -> None:
@@ -48,19 +58,6 @@ def _cleanup_expired_sessions(now: datetime) -> None:
             _SESSIONS.pop(key, None)
 
 
-
-def _normalize_words(text: str, morph: pymorphy3.MorphAnalyzer) -> set[str]:
-    tokens = re.findall(r"[а-яёa-z]+", text.lower())
-    lemmas: set[str] = set()
-    for token in tokens:
-        try:
-            parsed = morph.parse(token)
-        except Exception:  # pragma: no cover - защита от редких сбоев pymorphy
-            parsed = None
-        lemmas.add(parsed[0].normal_form if parsed else token)
-    return lemmas
-
-
 class DialogStep(IntEnum):
     INTENT_DETECTION = 0
     CHECKIN_DATE = 1
@@ -275,7 +272,7 @@ def get_room_price_from_shelter(
     headers = {"Content-Type": "application/json", "token": token}
 
     try:
-        response = requests.post(
+        response = _SHELTER_HTTP.post(
             SHELTER_URL,
             headers=headers,
             json=payload,
@@ -353,10 +350,13 @@ class BookingDialog:
         return {"answer": message, "mode": "booking"}
 
     def _is_booking_intent(self) -> bool:
-        normalized_words = _normalize_words(self.text, self.morph)
-        has_keyword = bool(PRICE_KEYWORD_LEMMAS & normalized_words)
-        has_phrase = any(phrase in self.text.lower() for phrase in PRICE_KEYWORD_PHRASES)
-        return has_keyword or has_phrase
+        # Фраза ищется одним проходом регулярки и избавляет от лемматизации
+        if _PRICE_PHRASE_PATTERN.search(self.text):
+            return True
+        return any(
+            lemmatize(token, self.morph) in PRICE_KEYWORD_LEMMAS
+            for token in _WORD_PATTERN.findall(self.text.lower())
+        )
 
     def _handle_intent(self) -> Optional[dict[str, str]]:
         if not self._is_booking_intent():
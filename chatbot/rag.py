@@ -4,9 +4,6 @@ from __future__ import annotations
 import logging
 from dataclasses import dataclass
 import re
-from typing import Sequence
-
-import numpy as np
 
 
 _LOGGER = logging.getLogger("chatbot.rag")
@@ -32,26 +29,20 @@ def normalize_text(text: str, morph) -> str:
     for word in _WORD_PATTERN.findall(text.lower()):
         lemma = cache.get(word)
         if lemma is None:
-            lemma = _lemmatize_word(word, morph)
-            if len(cache) >= _LEMMA_CACHE_MAX_SIZE:
-                cache.clear()
-            cache[word] = lemma
+            lemma = _cache_lemma(word, morph, cache)
         lemmas.append(lemma)
 
     return " ".join(lemmas)
 
 
-def encode(text: str, model) -> list[float]:
-    """Кодирование текста запроса с добавлением e5-префикса."""
+def lemmatize(word: str, morph) -> str:
+    """Вернуть лемму слова в нижнем регистре через общий кэш анализатора."""
 
-    cleaned = text.strip()
-    prepared = f"query: {cleaned}" if cleaned else "query:"
-    vector = model.encode(prepared)
-    if isinstance(vector, np.ndarray):
-        return vector.tolist()
-    if isinstance(vector, Sequence):
-        return list(vector)
-    raise TypeError("Модель эмбеддингов вернула неподдерживаемый тип вектора")
+    cache = _ensure_lemma_cache(morph)
+    lemma = cache.get(word)
+    if lemma is None:
+        lemma = _cache_lemma(word, morph, cache)
+    return lemma
 
 
 def _ensure_lemma_cache(morph) -> dict[str, str]:
@@ -62,6 +53,14 @@ def _ensure_lemma_cache(morph) -> dict[str, str]:
     return cache
 
 
+def _cache_lemma(word: str, morph, cache: dict[str, str]) -> str:
+    lemma = _lemmatize_word(word, morph)
+    if len(cache) >= _LEMMA_CACHE_MAX_SIZE:
+        cache.clear()
+    cache[word] = lemma
+    return lemma
+
+
 def _lemmatize_word(word: str, morph) -> str:
     try:
         parsed = morph.parse(word)
@@ -74,5 +73,5 @@ def _lemmatize_word(word: str, morph) -> str:
 __all__ = [
     "SearchResult",
     "normalize_text",
-    "encode",
+    "lemmatize",
 ]
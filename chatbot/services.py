@@ -11,9 +11,11 @@ import pymorphy3
 from .config import Settings
 from .embedding_loader import resolve_embedding_model
 from .local_index import LocalIndex
+from .rag import normalize_text
 
 
 LOGGER = logging.getLogger("chatbot.services")
+_WARMUP_TEXT = "разогрев"
 
 
 @dataclass(slots=True)
@@ -75,6 +77,8 @@ def create_dependencies(settings: Settings) -> Dependencies:
             )
         embedding_model = local_index
 
+    _warm_up(morph_analyzer, local_index)
+
     return Dependencies(
         morph=morph_analyzer,
         embedding_model=embedding_model,
@@ -82,4 +86,19 @@ def create_dependencies(settings: Settings) -> Dependencies:
     )
 
 
+def _warm_up(morph, local_index: LocalIndex | None) -> None:
+    """Прогнать пробный запрос, чтобы первый пользователь не ждал ленивой инициализации.
+
+    С ``preload_app`` прогрев выполняется в мастере gunicorn до fork, и воркеры
+    получают уже инициализированные словари pymorphy и индекс. Модель
+    эмбеддингов не прогревается: запросы её не вызывают.
+    """
+
+    warmup_start = perf_counter()
+    normalized = normalize_text(_WARMUP_TEXT, morph)
+    if local_index is not None:
+        local_index.search(normalized, limit=1)
+    LOGGER.info("Прогрев зависимостей занял %.2f с", perf_counter() - warmup_start)
+
+
 __all__ = ["Dependencies", "create_dependencies"]
@@ -1,23 +1,33 @@
 """Web-слой чат-бота."""
 from __future__ import annotations
 
+import atexit
+import hashlib
 import logging
 import os
+import queue
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Any
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, TypedDict
 
+import orjson
 import requests
-from flask import Flask, current_app, jsonify, request
+from flask import Flask, Response, current_app, jsonify, request
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 
 from .amvera import (
+    MISSING_TOKEN_MESSAGE,
     AmveraError,
     build_payload,
-    ensure_token,
+    decode_response,
     extract_answer,
     log_error,
     perform_request,
+    prepare_headers,
 )
+from .cache import TTLCache
 from .config import Settings
 from .price_dialog import clear_booking_session, handle_price_dialog
 from .rag import SearchResult, normalize_text
@@ -25,9 +35,19 @@ from .services import Dependencies, create_dependencies
 
 
 LOGGER = logging.getLogger("chatbot")
-CANCEL_COMMANDS = {"отмена", "сброс", "начать заново", "стоп", "reset"}
+CANCEL_COMMANDS = frozenset({"отмена", "сброс", "начать заново", "стоп", "reset"})
+_CANCEL_COMMAND_MAX_LENGTH = max(len(command) for command in CANCEL_COMMANDS)
 ERROR_MESSAGE = "Извините, не удалось получить ответ. Пожалуйста, попробуйте позже."
 
+_SESSION_ID_BYTES = 16
+_SESSION_ID_BATCH_SIZE = 256
+_SESSION_ID_POOL: deque[str] = deque()
+# Пул не должен переживать fork: иначе gunicorn-воркеры выдали бы одинаковые id.
+os.register_at_fork(after_in_child=_SESSION_ID_POOL.clear)
+# Состояние с версионным префиксом; copy() дешевле, чем создавать хэшер заново
+_ANSWER_KEY_HASHER = hashlib.blake2b(b"answer:v1\x1f", digest_size=16)
+_SEARCH_KEY_HASHER = hashlib.blake2b(b"search:v1\x1f", digest_size=16)
+
 
 @dataclass(frozen=True)
 class AppContainer:
@@ -36,20 +56,62 @@ class AppContainer:
     settings: Settings
     dependencies: Dependencies
     collections: tuple[str, ...]
+    answer_cache: TTLCache[str] = field(default_factory=lambda: TTLCache(0, 0))
+    search_cache: TTLCache[tuple[SearchResult, ...]] = field(
+        default_factory=lambda: TTLCache(0, 0)
+    )
+    amvera_headers: dict[str, str] | None = None
+
+
+class _LogWriter:
+    """Фоновый поток, который пишет записи из очереди в stderr.
+
+    Потоки запросов только кладут запись в очередь и не ждут записи в поток
+    вывода. Поток-писатель не переживает fork, поэтому перед fork он
+    останавливается (дописывая очередь), а после — запускается заново и в
+    мастере gunicorn, и в каждом воркере.
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue, handler: logging.Handler) -> None:
+        self._listener = QueueListener(log_queue, handler)
+        self._running = False
+
+    def start(self) -> None:
+        if not self._running:
+            self._listener.start()
+            self._running = True
+
+    def stop(self) -> None:
+        if self._running:
+            self._listener.stop()
+            self._running = False
 
 
 def configure_logging() -> None:
     """Настроить базовое логирование один раз за время жизни процесса."""
 
-    if logging.getLogger().handlers:
+    root_logger = logging.getLogger()
+    if root_logger.handlers:
         return
 
     level_name = os.getenv("LOG_LEVEL", "INFO").upper()
-    level = getattr(logging, level_name, logging.INFO)
-    logging.basicConfig(
-        level=level,
-        format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+    root_logger.setLevel(getattr(logging, level_name, logging.INFO))
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s")
     )
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root_logger.addHandler(QueueHandler(log_queue))
+
+    writer = _LogWriter(log_queue, stream_handler)
+    writer.start()
+    os.register_at_fork(
+        before=writer.stop,
+        after_in_parent=writer.start,
+        after_in_child=writer.start,
+    )
+    atexit.register(writer.stop)
 
 
 def _collect_public_endpoints(app: Flask) -> list[str]:
@@ -78,14 +140,158 @@ def _collect_public_endpoints(app: Flask) -> list[str]:
     return ordered
 
 
-def _json_reply(session_id: str, message: str, **extra: Any):
+def _build_home_payload(
+    container: AppContainer, endpoints: tuple[str, ...]
+) -> dict[str, Any]:
+    deps = container.dependencies
+    settings = container.settings
+    return {
+        "status": "ok",
+        "message": "Усадьба 'Четыре Сезона' - AI Assistant",
+        "version": "4.0",
+        "features": ["RAG", "Booking Dialog"],
+        "embedding_model": settings.embedding_model,
+        "embedding_dim": deps.embedding_model.get_sentence_embedding_dimension(),
+        "embedding_source": getattr(
+            deps.embedding_model,
+            "_resolved_from",
+            settings.embedding_model,
+        ),
+        "search_backend": "local" if deps.local_index else "disabled",
+        "endpoints": list(endpoints),
+    }
+
+
+class ChatRequest(TypedDict, total=False):
+    """Провалидированные поля тела запроса к чату."""
+
+    message: str
+    session_id: str
+
+
+def _read_chat_request() -> ChatRequest:
+    """Разобрать тело запроса за один проход orjson без кэширования сырых байтов.
+
+    Как и ``get_json(silent=True)``, тела с Content-Type, отличным от JSON,
+    игнорируются: иначе простые cross-origin запросы ``text/plain`` проходили
+    бы без CORS-preflight.
+    """
+
+    if not request.is_json:
+        return {}
+    raw = request.get_data(cache=False)
+    try:
+        data = orjson.loads(raw) if raw else None
+    except orjson.JSONDecodeError:
+        data = None
+
+    parsed: ChatRequest = {}
+    if not isinstance(data, dict):
+        return parsed
+
+    message = data.get("message")
+    if isinstance(message, str):
+        parsed["message"] = message.strip()
+    session_id = data.get("session_id")
+    if isinstance(session_id, str) and session_id:
+        parsed["session_id"] = session_id
+    return parsed
+
+
+def _new_session_id() -> str:
+    """Выдать случайный id сессии из пула, пополняемого одним вызовом urandom."""
+
+    try:
+        return _SESSION_ID_POOL.popleft()
+    except IndexError:
+        pass
+
+    entropy = os.urandom(_SESSION_ID_BYTES * _SESSION_ID_BATCH_SIZE)
+    session_ids = [
+        entropy[offset : offset + _SESSION_ID_BYTES].hex()
+        for offset in range(0, len(entropy), _SESSION_ID_BYTES)
+    ]
+    _SESSION_ID_POOL.extend(session_ids[1:])
+    return session_ids[0]
+
+
+class OrjsonProvider(JSONProvider):
+    """JSON-провайдер Flask на orjson: через него работают ``jsonify`` и ``request.json``."""
+
+    # Ключи не сортируем (аналог JSON_SORT_KEYS = False): порядок задаёт сам словарь
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, option=self._OPTIONS).decode()
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, option=self._OPTIONS),
+            mimetype="application/json",
+        )
+
+
+def _json_reply(session_id: str, message: str, **extra: Any) -> Response:
     payload = {"response": message, "session_id": session_id}
     payload.update(extra)
     return jsonify(payload)
 
 
-def _build_context(results: list[SearchResult]) -> str:
-    return "\n\n".join(result.text for result in results)
+def _answer_cache_key(normalized: str) -> bytes:
+    # Контекст однозначно определяется нормализованным вопросом: индекс
+    # неизменен до перезапуска процесса, а вместе с ним сбрасывается и кэш
+    hasher = _ANSWER_KEY_HASHER.copy()
+    hasher.update(normalized.encode())
+    return hasher.digest()
+
+
+def _search_cache_key(normalized: str, limit: int) -> bytes:
+    # Дайджест фиксированной длины: ключ не удерживает в памяти текст запроса
+    hasher = _SEARCH_KEY_HASHER.copy()
+    hasher.update(f"{limit}\x1f{normalized}".encode())
+    return hasher.digest()
+
+
+_CONTEXT_SEPARATOR_LENGTH = len("\n\n")
+_CONTEXT_DEDUP_PREFIX = 80
+# Обрезок короче этого не несёт смысла и только тратит токены
+_CONTEXT_MIN_FRAGMENT = _CONTEXT_DEDUP_PREFIX
+
+
+def _build_context(results: list[SearchResult], max_chars: int) -> list[str]:
+    """Отобрать фрагменты контекста без дублей в пределах бюджета символов.
+
+    Фрагменты с одинаковым началом считаются дублями. Разделитель между
+    фрагментами входит в бюджет; второй и следующие фрагменты не добавляются,
+    если на них осталось меньше ``_CONTEXT_MIN_FRAGMENT`` символов. Нулевой
+    ``max_chars`` снимает ограничение длины.
+    """
+
+    parts: list[str] = []
+    seen_prefixes: set[str] = set()
+    used = 0
+    for result in results:
+        text = result.text.strip()
+        if not text:
+            continue
+        prefix = text[:_CONTEXT_DEDUP_PREFIX]
+        if prefix in seen_prefixes:
+            continue
+        seen_prefixes.add(prefix)
+
+        if max_chars:
+            separator = _CONTEXT_SEPARATOR_LENGTH if parts else 0
+            remaining = max_chars - used - separator
+            if parts and remaining < _CONTEXT_MIN_FRAGMENT:
+                break
+            text = text[:remaining]
+            used += separator + len(text)
+        parts.append(text)
+    return parts
 
 
 @dataclass(slots=True)
@@ -102,11 +308,15 @@ class ChatResponder:
 
     container: AppContainer
 
-    def handle(self, session_id: str, question: str) -> ChatResponse:
+    def handle(
+        self, session_id: str, question: str, *, include_debug: bool = False
+    ) -> ChatResponse:
         LOGGER.info("Вопрос [%s]: %s", session_id[:8], question)
 
-        lower_question = question.lower()
-        if lower_question in CANCEL_COMMANDS:
+        if (
+            len(question) <= _CANCEL_COMMAND_MAX_LENGTH
+            and question.lower() in CANCEL_COMMANDS
+        ):
             self._clear_booking_session(session_id)
             return ChatResponse("Диалог сброшен. Чем могу помочь?")
 
@@ -122,21 +332,26 @@ class ChatResponder:
         normalized = self.normalize(question)
         LOGGER.debug("Нормализованный запрос: %s", normalized)
 
-        search_results, query_embedding, backend = self.perform_semantic_search(
+        answer_cache_key = _answer_cache_key(normalized)
+        cached_answer = self.container.answer_cache.get(answer_cache_key)
+        if cached_answer is not None and not include_debug:
+            LOGGER.debug("Ответ взят из локального кэша")
+            return ChatResponse(cached_answer)
+
+        search_results, backend = self.perform_semantic_search(
             normalized,
             limit=5,
         )
 
-        LOGGER.debug("Размер эмбеддинга запроса: %s", len(query_embedding))
-        if backend == "local":
+        if backend != "local":
+            LOGGER.warning("Локальный поиск недоступен")
+        elif LOGGER.isEnabledFor(logging.INFO):
             local_index = self.container.dependencies.local_index
             document_count = local_index.document_count if local_index else 0
             LOGGER.info(
                 "Поиск в локальном индексе (%s документов)",
                 document_count,
             )
-        else:
-            LOGGER.warning("Локальный поиск недоступен")
 
         if not search_results:
             LOGGER.info("Ничего не найдено ни в одной коллекции")
@@ -145,26 +360,38 @@ class ChatResponder:
                 "Попробуйте переформулировать или свяжитесь с администратором.",
             )
 
-        LOGGER.debug("Топ-результаты: %s", search_results[:3])
+        # Срезы и превью считаются только при включённом уровне логирования
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug("Топ-результаты: %s", search_results[:3])
 
-        context = _build_context(search_results[:3])
-        if not context.strip():
+        context_parts = _build_context(
+            search_results[:3],
+            self.container.settings.context_max_chars,
+        )
+        if not context_parts:
             LOGGER.warning("Контекст пуст после поиска по базе знаний")
             return ChatResponse(
                 "Извините, не удалось сформировать ответ. "
                 "Попробуйте переформулировать вопрос.",
             )
 
-        LOGGER.debug("Итоговый контекст длиной %s символов", len(context))
+        LOGGER.debug("Итоговый контекст из %s фрагментов", len(context_parts))
+
+        if cached_answer is not None:
+            answer = cached_answer
+        else:
+            answer = self._generate_response(context_parts, question, answer_cache_key)
+        if LOGGER.isEnabledFor(logging.INFO):
+            LOGGER.info("Ответ сгенерирован: %s", answer[:100].replace("\n", " "))
 
-        answer = self._generate_response(context, question)
-        LOGGER.info("Ответ сгенерирован: %s", answer[:100].replace("\n", " "))
+        if not include_debug:
+            return ChatResponse(answer)
 
         debug_info = {
             "top_collection": search_results[0].collection,
             "top_score": search_results[0].score,
             "results_count": len(search_results),
-            "embedding_dim": len(query_embedding),
+            "embedding_dim": self.embedding_dimension(),
             "search_backend": backend,
         }
         return ChatResponse(answer, {"debug_info": debug_info})
@@ -172,30 +399,42 @@ class ChatResponder:
     def normalize(self, text: str) -> str:
         return normalize_text(text, self.container.dependencies.morph)
 
+    def embedding_dimension(self) -> int:
+        local_index = self.container.dependencies.local_index
+        return local_index.embedding_dimension if local_index is not None else 0
+
     def perform_semantic_search(
         self, normalized: str, *, limit: int
-    ) -> tuple[list[SearchResult], list[float], str]:
+    ) -> tuple[list[SearchResult], str]:
         local_index = self.container.dependencies.local_index
         if local_index is None:
             LOGGER.warning("Локальный индекс недоступен, поиск отключён")
-            return [], [], "disabled"
-
-        results, query_vector = local_index.search(normalized, limit=limit)
-        return results, query_vector, "local"
-
-    def _generate_response(self, context: str, question: str) -> str:
+            return [], "disabled"
+
+        # Индекс неизменен после старта, поэтому результат зависит только от запроса
+        search_cache = self.container.search_cache
+        cache_key = _search_cache_key(normalized, limit)
+        cached = search_cache.get(cache_key)
+        if cached is not None:
+            return list(cached), "local"
+
+        results = local_index.search(normalized, limit=limit)
+        search_cache.set(cache_key, tuple(results))
+        return results, "local"
+
+    def _generate_response(
+        self, context_parts: list[str], question: str, cache_key: bytes
+    ) -> str:
         settings = self.container.settings
-
-        try:
-            token = ensure_token(settings)
-        except AmveraError as exc:
-            LOGGER.warning("%s", exc)
+        headers = self.container.amvera_headers
+        if headers is None:
+            LOGGER.warning("%s", MISSING_TOKEN_MESSAGE)
             return ERROR_MESSAGE
 
-        payload = build_payload(settings.amvera_model, context, question)
+        payload = build_payload(settings.amvera_model, context_parts, question)
 
         try:
-            response = perform_request(settings, token, payload, timeout=60)
+            response = perform_request(settings, headers, payload, timeout=60)
         except requests.RequestException as exc:
             LOGGER.warning("Не удалось выполнить запрос к Amvera API: %s", exc)
             return ERROR_MESSAGE
@@ -205,7 +444,7 @@ class ChatResponder:
             return ERROR_MESSAGE
 
         try:
-            data = response.json()
+            data = decode_response(response)
         except ValueError:
             LOGGER.warning("Не удалось распарсить ответ Amvera как JSON")
             return ERROR_MESSAGE
@@ -216,6 +455,7 @@ class ChatResponder:
             LOGGER.warning("%s", exc)
             return ERROR_MESSAGE
 
+        self.container.answer_cache.set(cache_key, answer)
         return answer
 
     def _clear_booking_session(self, session_id: str) -> None:
@@ -283,13 +523,29 @@ def create_app(
     else:
         collections = ()
 
+    try:
+        amvera_headers = prepare_headers(resolved_settings)
+    except AmveraError as exc:
+        LOGGER.warning("%s", exc)
+        amvera_headers = None
+
     container = AppContainer(
         settings=resolved_settings,
         dependencies=resolved_dependencies,
         collections=collections,
+        answer_cache=TTLCache(
+            resolved_settings.answer_cache_size,
+            resolved_settings.answer_cache_ttl,
+        ),
+        search_cache=TTLCache(
+            resolved_settings.search_cache_size,
+            resolved_settings.search_cache_ttl,
+        ),
+        amvera_headers=amvera_headers,
     )
 
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
     CORS(app)
     app.config["container"] = container
 
@@ -305,15 +561,19 @@ def register_routes(app: Flask) -> None:
     @app.route("/api/chat", methods=["POST"])
     def chat() -> Any:  # noqa: D401 - функция возвращает JSON-ответ
         container = _get_container()
-        data = request.get_json(silent=True) or {}
-        question = data.get("message", "").strip()
-        session_id = data.get("session_id") or os.urandom(16).hex()
+        data = _read_chat_request()
+        question = data.get("message", "")
+        session_id = data.get("session_id") or _new_session_id()
 
         if not question:
             return _json_reply(session_id, "Пожалуйста, введите вопрос.")
 
         responder = ChatResponder(container)
-        response = responder.handle(session_id, question)
+        response = responder.handle(
+            session_id,
+            question,
+            include_debug=request.args.get("debug") in ("1", "true"),
+        )
         return _json_reply(session_id, response.message, **response.extra)
 
     @app.route("/api/debug/search", methods=["POST"])
@@ -321,14 +581,13 @@ def register_routes(app: Flask) -> None:
         container = _get_container()
         responder = ChatResponder(container)
 
-        data = request.get_json(silent=True) or {}
-        question = data.get("message", "").strip()
+        question = _read_chat_request().get("message", "")
 
         if not question:
             return jsonify({"error": "message required"}), 400
 
         normalized = responder.normalize(question)
-        results, vector, backend = responder.perform_semantic_search(
+        results, backend = responder.perform_semantic_search(
             normalized,
             limit=10,
         )
@@ -337,7 +596,7 @@ def register_routes(app: Flask) -> None:
             {
                 "question": question,
                 "normalized": normalized,
-                "embedding_dim": len(vector),
+                "embedding_dim": responder.embedding_dimension(),
                 "search_backend": backend,
                 "results": [
                     {
@@ -358,10 +617,9 @@ def register_routes(app: Flask) -> None:
         prompt = request.args.get("prompt", "Привет! Ответь 'ok'.")
         model_name = request.args.get("model") or settings.amvera_model
 
-        try:
-            token = ensure_token(settings)
-        except AmveraError as exc:
-            return jsonify({"status": "error", "message": str(exc)}), 503
+        headers = container.amvera_headers
+        if headers is None:
+            return jsonify({"status": "error", "message": MISSING_TOKEN_MESSAGE}), 503
 
         payload = {
             "model": model_name,
@@ -372,7 +630,7 @@ def register_routes(app: Flask) -> None:
         }
 
         try:
-            response = perform_request(settings, token, payload, timeout=30)
+            response = perform_request(settings, headers, payload, timeout=30)
         except requests.RequestException as exc:
             return (
                 jsonify(
@@ -386,7 +644,7 @@ def register_routes(app: Flask) -> None:
 
         if response.ok:
             try:
-                response_json = response.json()
+                response_json = decode_response(response)
             except ValueError:
                 response_json = {"raw": response.text}
             return jsonify(
@@ -400,7 +658,7 @@ def register_routes(app: Flask) -> None:
 
         log_error(response)
         try:
-            error_body = response.json()
+            error_body = decode_response(response)
         except ValueError:
             error_body = {"raw": response.text}
         return (
@@ -489,25 +747,19 @@ def register_routes(app: Flask) -> None:
     def health() -> Any:
         return "OK", 200
 
+    # Карта URL и зависимости не меняются после старта, поэтому ответ главной
+    # страницы сериализуется один раз — при первом запросе, чтобы
+    # register_routes не требовал готового контейнера.
+    public_endpoints = tuple(_collect_public_endpoints(app))
+    home_body: bytes | None = None
+
     @app.route("/")
     def home() -> Any:
-        container = _get_container()
-        deps = container.dependencies
-        settings = container.settings
-        return jsonify(
-            {
-                "status": "ok",
-                "message": "Усадьба 'Четыре Сезона' - AI Assistant",
-                "version": "4.0",
-                "features": ["RAG", "Booking Dialog"],
-                "embedding_model": settings.embedding_model,
-                "embedding_dim": deps.embedding_model.get_sentence_embedding_dimension(),
-                "embedding_source": getattr(
-                    deps.embedding_model,
-                    "_resolved_from",
-                    settings.embedding_model,
-                ),
-                "search_backend": "local" if deps.local_index else "disabled",
-                "endpoints": _collect_public_endpoints(app),
-            }
-        )
+        nonlocal home_body
+        if home_body is None:
+            # Присваивание готовых байтов атомарно: в гонке потоки соберут
+            # одинаковый ответ, и ни один не увидит частичного состояния
+            home_body = app.json.dumps(
+                _build_home_payload(_get_container(), public_endpoints)
+            ).encode()
+        return app.response_class(home_body, mimetype="application/json")
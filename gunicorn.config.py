@@ -36,14 +36,43 @@ def _resolve_workers(raw_value: str | None) -> int:
     return value
 
 
+# Большую часть времени запрос ждёт ответа Amvera GPT, поэтому потоков больше, чем ядер
+_DEFAULT_THREADS = 8
+
+
+def _resolve_threads(raw_value: str | None) -> int:
+    """Получить число потоков на worker из переменной окружения."""
+
+    if raw_value is None:
+        return _DEFAULT_THREADS
+
+    try:
+        value = int(raw_value)
+    except ValueError:
+        print(
+            "[gunicorn.config] Некорректное значение GUNICORN_THREADS. Используется значение по умолчанию.",
+            file=sys.stderr,
+        )
+        return _DEFAULT_THREADS
+
+    if value < 1:
+        print(
+            "[gunicorn.config] GUNICORN_THREADS должно быть положительным. Используется значение по умолчанию.",
+            file=sys.stderr,
+        )
+        return _DEFAULT_THREADS
+
+    return value
+
+
 # Количество worker-процессов
 workers = _resolve_workers(os.getenv("GUNICORN_WORKERS"))
 
-# Тип worker'ов
-worker_class = "sync"
+# Тип worker'ов: потоки делят одну копию модели и индекса внутри процесса
+worker_class = "gthread"
 
 # Максимальное количество одновременных запросов на worker
-threads = 2
+threads = _resolve_threads(os.getenv("GUNICORN_THREADS"))
 
 # Timeout для долгих запросов (важно для GPT и интеграций с внешними сервисами)
 timeout = 180
@@ -59,9 +88,20 @@ accesslog = "-"
 errorlog = "-"
 loglevel = "info"
 
-# Preload приложения (ускоряет запуск workers)
+# Preload приложения: модель и индекс загружаются один раз до fork и
+# разделяются workers через copy-on-write
 preload_app = True
 
+
+def post_fork(server, worker):
+    """Подогнать пулы HTTP-соединений приложения под число потоков воркера."""
+
+    from chatbot.http_client import resize_session_pools
+
+    resize_session_pools(worker.cfg.threads)
+    server.log.info("Пул HTTP-соединений воркера %s: %s", worker.pid, worker.cfg.threads)
+
+
 def _resolve_port(raw_value: str | None) -> int:
     """Получить порт, учитывая требования хостинга."""
 